@@ -1,6 +1,133 @@
+import numpy as np
 import pandas as pd
+from pandas.io.parsers import TextParser
 import os
+import re
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+# Leitor nativo (Rust) de planilhas - opcional, muito mais rápido que o openpyxl
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+# numexpr (opcional) avalia expressões aritméticas em um único passo, sem Series intermediárias
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
+# pyarrow (leitura colunar de CSV e limpeza de texto) - opcional, com fallback para o pandas
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv as pacsv
+except ImportError:
+    pa = None
+    pc = None
+    pacsv = None
+
+# Caracteres que não fazem parte de um número (R$, espaços, etc), compilado uma única vez
+PADRAO_NAO_NUMERICO = re.compile(r'[^\d.-]')
+# Número válido depois da limpeza (ex.: "-12", "3.5", ".5")
+PADRAO_NUMERO = re.compile(r'^-?(\d+\.?\d*|\.\d+)$')
+
+# Possíveis nomes da coluna com a sigla da UF
+COLUNAS_UF = [
+    'Sigla da Unidade da Federação', 'UF', 'Estado', 'uf', 'estado', 
+    'SIGLA_UF', 'SG_UF', 'SG_ESTADO'
+]
+
+def ler_csv_arrow(arquivo_entrada, delimitador=',', encoding='utf-8'):
+    """
+    Ler um CSV/TSV com o pyarrow, filtrando as linhas do Pará ainda no formato Arrow
+    (as linhas dos outros estados nunca viram objetos Python).
+    
+    Retorna uma tupla (DataFrame, total de linhas do arquivo original).
+    """
+    tabela = pacsv.read_csv(
+        arquivo_entrada,
+        read_options=pacsv.ReadOptions(encoding=encoding),
+        parse_options=pacsv.ParseOptions(delimiter=delimitador),
+        convert_options=pacsv.ConvertOptions(strings_can_be_null=True)
+    )
+    # O pyarrow não falha com bytes que não são UTF-8: as colunas viram binary e o
+    # cabeçalho recebe o caractere de substituição. Nesses casos o arquivo está em outro encoding.
+    if encoding == 'utf-8' and (
+        any(pa.types.is_binary(campo.type) for campo in tabela.schema)
+        or any('\ufffd' in nome for nome in tabela.column_names)
+    ):
+        raise UnicodeDecodeError('utf-8', b'', 0, 1, 'arquivo não está em UTF-8')
+    
+    total_linhas = tabela.num_rows
+    
+    coluna_uf = next((col for col in COLUNAS_UF if col in tabela.column_names), None)
+    if coluna_uf is not None:
+        tabela = tabela.filter(pc.equal(tabela[coluna_uf], 'PA'))
+    
+    return tabela.to_pandas(), total_linhas
+
+def ler_excel_calamine(arquivo_entrada):
+    """
+    Ler a primeira aba de uma planilha com o python-calamine, descartando as linhas
+    dos outros estados antes de montar o DataFrame.
+    
+    Retorna uma tupla (DataFrame, total de linhas do arquivo original).
+    """
+    planilha = python_calamine.CalamineWorkbook.from_path(arquivo_entrada).get_sheet_by_index(0)
+    linhas = planilha.to_python(skip_empty_area=False)
+    cabecalho, dados = linhas[0], linhas[1:]
+    
+    coluna_uf = next((col for col in COLUNAS_UF if col in cabecalho), None)
+    if coluna_uf is not None:
+        indice_uf = cabecalho.index(coluna_uf)
+        dados = [linha for linha in dados if linha[indice_uf] == 'PA']
+    
+    # Mesma conversão de células do leitor calamine do pandas: floats inteiros viram int
+    # e datas viram datetime
+    def converter_celula(valor):
+        if isinstance(valor, float) and valor.is_integer():
+            return int(valor)
+        if isinstance(valor, date) and not isinstance(valor, datetime):
+            return datetime(valor.year, valor.month, valor.day)
+        return valor
+    
+    dados = [[converter_celula(valor) for valor in linha] for linha in dados]
+    # Montar o DataFrame pelo mesmo parser usado pelo pd.read_excel: inferência de tipos
+    # (ex.: códigos salvos como texto viram int), células vazias como NaN e limpeza do
+    # cabeçalho ('Unnamed: N', colunas repetidas renomeadas para X.1)
+    df = TextParser([cabecalho] + dados, header=0, skip_blank_lines=False).read()
+    return df, len(linhas) - 1
+
+def converter_coluna_numerica(serie):
+    """
+    Converter uma coluna de valores monetários em texto (ex.: " 1234,5 ", "R$ 10") para número.
+    Com o pyarrow, a limpeza roda sobre o buffer UTF-8 da coluna (regex RE2), sem criar uma
+    string Python por célula.
+    """
+    if pc is None:
+        # Remover espaços e substituir vírgula por ponto se necessário
+        serie = serie.astype(str).str.strip().str.replace(',', '.')
+        # Remover possíveis caracteres não numéricos (R$, etc)
+        serie = serie.str.replace(PADRAO_NAO_NUMERICO, '', regex=True)
+        return pd.to_numeric(serie, errors='coerce')
+    
+    valores = pa.array(serie.astype('string'), type=pa.string())
+    valores = pc.utf8_trim_whitespace(valores)
+    valores = pc.replace_substring(valores, ',', '.')
+    valores = pc.replace_substring_regex(valores, PADRAO_NAO_NUMERICO.pattern, '')
+    # Valores que não formam um número ('', '-', '1.2.3') viram nulos, como no
+    # pd.to_numeric(errors='coerce'), e o restante é convertido sem sair do Arrow
+    valores = pc.if_else(pc.match_substring_regex(valores, PADRAO_NUMERO.pattern), valores, None)
+    # Como no pd.to_numeric: coluna sem nulos e só com inteiros continua inteira
+    somente_inteiros = (
+        valores.null_count == 0
+        and not pc.any(pc.match_substring(valores, '.')).as_py()
+    )
+    valores = pc.cast(valores, pa.int64() if somente_inteiros else pa.float64())
+    return pd.Series(valores.to_numpy(zero_copy_only=False), index=serie.index)
 
 def converter_dados_pib_para(arquivo_entrada=None, arquivo_saida="pib_para_estudo.csv"):
     """
@@ -17,10 +144,14 @@ def converter_dados_pib_para(arquivo_entrada=None, arquivo_saida="pib_para_estud
     # Se não foi fornecido arquivo de entrada, procurar por arquivos no diretório atual
     if arquivo_entrada is None:
         # Verificar possíveis arquivos de entrada (por ordem de prioridade)
-        possiveis_arquivos = [
-            f for f in os.listdir('.') 
-            if f.endswith(('.xlsx', '.xls', '.csv', '.tsv')) and 'pib' in f.lower()
-        ]
+        # os.scandir já traz o tipo de cada entrada, sem um stat extra por arquivo
+        with os.scandir('.') as entradas:
+            possiveis_arquivos = [
+                entrada.name for entrada in entradas
+                if entrada.is_file()
+                and entrada.name.endswith(('.xlsx', '.xls', '.csv', '.tsv'))
+                and 'pib' in entrada.name.lower()
+            ]
         
         if not possiveis_arquivos:
             print("Erro: Nenhum arquivo de dados PIB encontrado no diretório atual.")
@@ -32,46 +163,85 @@ def converter_dados_pib_para(arquivo_entrada=None, arquivo_saida="pib_para_estud
     
     print(f"Processando arquivo: {arquivo_entrada}")
     
+    # Se existir o arquivo com o ano de criação dos municípios, carregá-lo em paralelo
+    # com o arquivo principal (as leituras do pandas/pyarrow liberam o GIL)
+    arquivo_anos = "municipios_criacao.csv"
+    futuro_anos = None
+    if os.path.exists(arquivo_anos):
+        executor = ThreadPoolExecutor(max_workers=1)
+        futuro_anos = executor.submit(pd.read_csv, arquivo_anos)
+        executor.shutdown(wait=False)
+    
     try:
         # Detectar formato do arquivo baseado na extensão
         extensao = os.path.splitext(arquivo_entrada)[1].lower()
+        total_linhas = None
         
         if extensao in ['.xlsx', '.xls']:
             # Ler arquivo Excel
             print("Detectado arquivo Excel.")
-            try:
-                # Tentar ler primeiro usando engine openpyxl (para .xlsx)
-                df = pd.read_excel(arquivo_entrada, engine='openpyxl')
-            except:
-                # Se falhar, tentar com engine xlrd (para .xls)
-                df = pd.read_excel(arquivo_entrada, engine='xlrd')
+            df = None
+            if python_calamine is not None:
+                try:
+                    # Tentar ler primeiro com o calamine, filtrando o Pará antes de montar o DataFrame
+                    df, total_linhas = ler_excel_calamine(arquivo_entrada)
+                except Exception:
+                    df = None
+            if df is None:
+                try:
+                    # Tentar ler usando engine openpyxl (para .xlsx)
+                    df = pd.read_excel(arquivo_entrada, engine='openpyxl')
+                except:
+                    # Se falhar, tentar com engine xlrd (para .xls)
+                    df = pd.read_excel(arquivo_entrada, engine='xlrd')
         elif extensao == '.csv':
             # Tentar diferentes encodings e delimitadores para CSV
-            try:
-                df = pd.read_csv(arquivo_entrada, encoding='utf-8')
-            except:
+            df = None
+            if pacsv is not None:
                 try:
-                    df = pd.read_csv(arquivo_entrada, encoding='latin1')
+                    df, total_linhas = ler_csv_arrow(arquivo_entrada, ',', 'utf-8')
+                except UnicodeDecodeError:
+                    # Só vale tentar de novo com latin1 se o problema for o encoding
+                    try:
+                        df, total_linhas = ler_csv_arrow(arquivo_entrada, ',', 'latin1')
+                    except Exception:
+                        df = None
+                except Exception:
+                    # Outros erros de parsing: direto para o pd.read_csv
+                    df = None
+            if df is None:
+                # pd.read_csv é mais tolerante com arquivos malformados (ex.: cabeçalho com colunas a mais)
+                try:
+                    df = pd.read_csv(arquivo_entrada, encoding='utf-8')
                 except:
-                    # Tentar com delimiter específico (ponto e vírgula comum em CSVs brasileiros)
-                    df = pd.read_csv(arquivo_entrada, encoding='utf-8', sep=';')
+                    try:
+                        df = pd.read_csv(arquivo_entrada, encoding='latin1')
+                    except:
+                        # Tentar com delimiter específico (ponto e vírgula comum em CSVs brasileiros)
+                        df = pd.read_csv(arquivo_entrada, encoding='utf-8', sep=';')
         elif extensao == '.tsv':
             # Ler arquivo TSV
-            df = pd.read_csv(arquivo_entrada, sep='\t', encoding='utf-8')
+            df = None
+            if pacsv is not None:
+                try:
+                    df, total_linhas = ler_csv_arrow(arquivo_entrada, '\t', 'utf-8')
+                except Exception:
+                    df = None
+            if df is None:
+                df = pd.read_csv(arquivo_entrada, sep='\t', encoding='utf-8')
         else:
             print(f"Erro: Formato de arquivo não suportado - {extensao}")
             return
         
         # Mostrar informações básicas
-        print(f"Total de linhas no arquivo original: {len(df)}")
+        if total_linhas is None:
+            total_linhas = len(df)
+        print(f"Total de linhas no arquivo original: {total_linhas}")
         print(f"Colunas disponíveis: {', '.join(df.columns[:5])}...")
         
         # Verificar se o DataFrame tem a coluna necessária para filtrar
         coluna_uf = None
-        for possivel_coluna in [
-            'Sigla da Unidade da Federação', 'UF', 'Estado', 'uf', 'estado', 
-            'SIGLA_UF', 'SG_UF', 'SG_ESTADO'
-        ]:
+        for possivel_coluna in COLUNAS_UF:
             if possivel_coluna in df.columns:
                 coluna_uf = possivel_coluna
                 break
@@ -156,13 +326,11 @@ def converter_dados_pib_para(arquivo_entrada=None, arquivo_saida="pib_para_estud
         # Criar mapeamento de colunas encontradas para nomes padronizados
         mapeamento = {}
         colunas_encontradas = []
+        # Conjunto das colunas disponíveis: busca O(1) em vez de varrer o Index a cada alternativa
+        colunas_disponiveis = set(df_para.columns)
         
         for coluna_padrao, alternativas in colunas_padrao.items():
-            coluna_encontrada = None
-            for alt in alternativas:
-                if alt in df_para.columns:
-                    coluna_encontrada = alt
-                    break
+            coluna_encontrada = next((alt for alt in alternativas if alt in colunas_disponiveis), None)
             
             if coluna_encontrada:
                 colunas_encontradas.append(coluna_encontrada)
@@ -170,12 +338,9 @@ def converter_dados_pib_para(arquivo_entrada=None, arquivo_saida="pib_para_estud
                 if coluna_encontrada != alternativas[1]:  # alternativas[1] é o nome limpo padronizado
                     mapeamento[coluna_encontrada] = alternativas[1]
         
-        # Selecionar apenas colunas encontradas
-        df_para_limpo = df_para[colunas_encontradas].copy()
-        
-        # Renomear colunas se necessário
-        if mapeamento:
-            df_para_limpo = df_para_limpo.rename(columns=mapeamento)
+        # Selecionar apenas colunas encontradas e renomear (se necessário) em um único passo,
+        # sem a cópia intermediária do DataFrame selecionado
+        df_para_limpo = df_para.loc[:, colunas_encontradas].rename(columns=mapeamento)
         
         # Lista das colunas após renomeação
         colunas_finais = [mapeamento.get(col, col) for col in colunas_encontradas]
@@ -188,33 +353,31 @@ def converter_dados_pib_para(arquivo_entrada=None, arquivo_saida="pib_para_estud
         
         for coluna in colunas_numericas:
             if coluna in df_para_limpo.columns:
-                # Remover espaços e substituir vírgula por ponto se necessário
-                df_para_limpo[coluna] = df_para_limpo[coluna].astype(str).str.strip().str.replace(',', '.')
-                # Remover possíveis caracteres não numéricos (R$, etc)
-                df_para_limpo[coluna] = df_para_limpo[coluna].str.replace(r'[^\d.-]', '', regex=True)
-                # Converter para float
-                df_para_limpo[coluna] = pd.to_numeric(df_para_limpo[coluna], errors='coerce')
+                df_para_limpo[coluna] = converter_coluna_numerica(df_para_limpo[coluna])
         
         # Adicionar coluna com o ano de criação do município (se disponível)
         try:
-            # Tentar carregar dados de ano de criação se existir um arquivo para isso
-            arquivo_anos = "municipios_criacao.csv"
-            if os.path.exists(arquivo_anos):
-                df_anos = pd.read_csv(arquivo_anos)
+            # Usar os dados de ano de criação se existir um arquivo para isso
+            if futuro_anos is not None:
+                df_anos = futuro_anos.result()
                 
                 # Verificar qual é a coluna de código do município nos dados carregados
                 col_codigo = 'codigo_municipio' if 'codigo_municipio' in df_para_limpo.columns else None
                 
                 if col_codigo:
-                    df_para_limpo = pd.merge(
-                        df_para_limpo, 
-                        df_anos[['codigo_municipio', 'ano_criacao']], 
-                        on='codigo_municipio', 
-                        how='left'
-                    )
+                    # Série ano_criacao indexada pelo código (sem duplicatas): o .map busca cada
+                    # código nesse índice e preenche a coluna, em vez de montar um novo DataFrame
+                    # com um merge
+                    anos_criacao = df_anos.set_index('codigo_municipio')['ano_criacao']
+                    # Códigos repetidos no arquivo: mantém a primeira ocorrência
+                    anos_criacao = anos_criacao[~anos_criacao.index.duplicated()]
+                    df_para_limpo['ano_criacao'] = df_para_limpo['codigo_municipio'].map(anos_criacao)
                     # Criar coluna de classificação conforme mencionado no relatório
-                    df_para_limpo['municipio_antigo'] = df_para_limpo['ano_criacao'].apply(
-                        lambda x: 'Sim' if x <= 1970 else 'Não' if pd.notna(x) else None
+                    # (vetorizado: código -1 deixa vazio quando o ano de criação é desconhecido)
+                    ano = df_para_limpo['ano_criacao']
+                    df_para_limpo['municipio_antigo'] = pd.Categorical.from_codes(
+                        np.where(ano.isna(), -1, np.where(ano <= 1970, 0, 1)),
+                        categories=['Sim', 'Não']
                     )
         except Exception as e:
             print(f"Nota: Não foi possível adicionar dados de ano de criação: {e}")
@@ -222,8 +385,15 @@ def converter_dados_pib_para(arquivo_entrada=None, arquivo_saida="pib_para_estud
             
         # Calcular proporção da agropecuária no PIB (importante para análise do desmatamento)
         if 'valor_agropecuaria' in df_para_limpo.columns and 'valor_total' in df_para_limpo.columns:
-            df_para_limpo['proporcao_agropecuaria'] = (df_para_limpo['valor_agropecuaria'] / 
-                                                    df_para_limpo['valor_total'] * 100)
+            # float64 explícito: a divisão é real mesmo se as colunas vierem como inteiros
+            agropecuaria = df_para_limpo['valor_agropecuaria'].to_numpy(dtype=np.float64)
+            total = df_para_limpo['valor_total'].to_numpy(dtype=np.float64)
+            if numexpr is not None:
+                df_para_limpo['proporcao_agropecuaria'] = numexpr.evaluate('agropecuaria / total * 100')
+            else:
+                # Mesmo comportamento do pandas: divisão por zero gera inf/NaN sem aviso
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    df_para_limpo['proporcao_agropecuaria'] = agropecuaria / total * 100
         
         # Salvar como CSV
         df_para_limpo.to_csv(arquivo_saida, index=False, encoding='utf-8')
@@ -1,7 +1,107 @@
 import geopandas as gpd
+import numpy as np
 import pandas as pd
 import os
-from shapely.geometry import MultiPolygon
+import shapely
+from concurrent.futures import ThreadPoolExecutor
+from shapely.geometry import MultiPolygon, box
+
+# Com o pyarrow instalado, o pyogrio entrega as feições direto em buffers Arrow
+try:
+    import pyarrow
+    USAR_ARROW = True
+except ImportError:
+    USAR_ARROW = False
+
+# Numba (opcional) compila o laço de soma por grupo; sem ele usamos np.bincount
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Envelope do estado do Pará (SIRGAS 2000), usado para descartar feições já no GDAL
+BBOX_PARA = gpd.GeoSeries([box(-59.0, -9.9, -46.0, 2.6)], crs="EPSG:4674")
+
+def ler_shapefile(caminho, **kwargs):
+    """
+    Lê um shapefile com o engine pyogrio (leitura em C, sem um dict Python por feição).
+    Argumentos extras (where, bbox, use_arrow, ...) são repassados para o gpd.read_file.
+    """
+    kwargs.setdefault('use_arrow', USAR_ARROW)
+    return gpd.read_file(caminho, engine='pyogrio', **kwargs)
+
+if njit is not None:
+    # cache=True grava o código compilado em __pycache__ (a compilação só ocorre na primeira
+    # execução) e nogil=True libera o GIL enquanto o laço roda
+    @njit(cache=True, nogil=True)
+    def _somar_por_grupo(chaves, valores, n_grupos):
+        somas = np.zeros(n_grupos)
+        contagens = np.zeros(n_grupos, dtype=np.int64)
+        for i in range(chaves.shape[0]):
+            somas[chaves[i]] += valores[i]
+            contagens[chaves[i]] += 1
+        return somas, contagens
+else:
+    def _somar_por_grupo(chaves, valores, n_grupos):
+        somas = np.bincount(chaves, weights=valores, minlength=n_grupos)
+        contagens = np.bincount(chaves, minlength=n_grupos)
+        return somas, contagens
+
+def somar_area_por_municipio_ano(gdf, municipio_col):
+    """
+    Soma 'area_km' por município e ano, equivalente a
+    gdf.groupby([municipio_col, 'year'])['area_km'].sum().reset_index().
+    
+    As duas chaves são fatoradas em códigos inteiros e combinadas em uma única chave,
+    e a soma é feita em um laço compilado, sem construir o índice de grupos do pandas.
+    """
+    cod_municipio, municipios = pd.factorize(gdf[municipio_col], sort=True)
+    cod_ano, anos = pd.factorize(gdf['year'], sort=True)
+    n_anos = len(anos)
+    
+    # Chaves nulas (código -1) ficam de fora, como no groupby
+    validos = (cod_municipio >= 0) & (cod_ano >= 0)
+    chaves = cod_municipio[validos].astype(np.int64) * n_anos + cod_ano[validos]
+    areas = np.nan_to_num(gdf['area_km'].to_numpy(dtype=np.float64)[validos])
+    
+    somas, contagens = _somar_por_grupo(chaves, areas, len(municipios) * n_anos)
+    
+    # Manter apenas as combinações município/ano presentes nos dados
+    grupos = np.flatnonzero(contagens)
+    return pd.DataFrame({
+        municipio_col: np.asarray(municipios)[grupos // n_anos],
+        'year': np.asarray(anos)[grupos % n_anos],
+        'area_km': somas[grupos]
+    })
+
+def agregar_por_municipio(para_gdf, municipios_para, municipio_col):
+    """
+    Intersecta os polígonos do PRODES com os municípios, calcula a área em km² e soma
+    as áreas por município e ano.
+    """
+    # Manter apenas as colunas usadas: cada linha da intersecção fica bem mais estreita
+    colunas_prodes = [col for col in ['year', 'area_km', municipio_col] if col in para_gdf.columns]
+    para_gdf = para_gdf[colunas_prodes + [para_gdf.geometry.name]]
+    colunas_municipios = [municipio_col] if municipio_col not in colunas_prodes else []
+    municipios_para = municipios_para[colunas_municipios + [municipios_para.geometry.name]]
+    
+    # Garantir que os sistemas de coordenadas sejam iguais
+    if para_gdf.crs != municipios_para.crs:
+        para_gdf = para_gdf.to_crs(municipios_para.crs)
+    
+    # Realizar a intersecção espacial
+    intersec_gdf = gpd.sjoin(para_gdf, municipios_para, how='inner', predicate='intersects')
+    
+    # Calcular a área de cada polígono em km²
+    if 'area_km' not in intersec_gdf.columns:
+        # Certifique-se de que o CRS esteja em uma projeção que preserva área
+        # Reprojeta apenas a GeoSeries, sem copiar as demais colunas
+        geometrias = intersec_gdf.geometry.to_crs(epsg=5880)  # Projeção SIRGAS 2000 / Brazil Polyconic
+        # shapely.area calcula todas as áreas em uma única chamada ao GEOS
+        intersec_gdf['area_km'] = shapely.area(geometrias.values) / 1_000_000  # Converter de m² para km²
+    
+    # Agrupar por município e ano, somando as áreas
+    return somar_area_por_municipio_ano(intersec_gdf, municipio_col)
 
 def processar_prodes_para(input_shapefile, output_csv):
     """
@@ -12,14 +112,48 @@ def processar_prodes_para(input_shapefile, output_csv):
         input_shapefile: Caminho para o arquivo shapefile do PRODES
         output_csv: Caminho para salvar o arquivo CSV de saída
     """
+    # Carregar shapefile dos municípios do Brasil em paralelo com o do PRODES
+    # (o pyogrio libera o GIL durante a leitura, então as duas leituras se sobrepõem)
+    # Você precisa ter este arquivo. Caso não tenha, pode baixá-lo do IBGE
+    print("Carregando shapefile dos municípios do Brasil...")
+    # Altere o caminho abaixo para o local onde está o shapefile dos municípios
+    municipios_path = "municipios_ibge/BR_Municipios_2022.shp"  # Substitua pelo caminho correto
+    executor = ThreadPoolExecutor(max_workers=1)
+    # Filtrar apenas municípios do Pará (filtro aplicado pelo GDAL na leitura)
+    futuro_municipios = executor.submit(ler_shapefile, municipios_path, where="SIGLA_UF = 'PA'")
+    executor.shutdown(wait=False)
+    
     print("Carregando o shapefile do PRODES...")
     # Carregar o shapefile do PRODES
-    try:
-        prodes_gdf = gpd.read_file(input_shapefile)
-        print(f"Shapefile carregado com sucesso. Total de registros: {len(prodes_gdf)}")
-    except Exception as e:
-        print(f"Erro ao carregar o shapefile: {str(e)}")
+    # Filtrar o Pará (e os anos a partir de 2008) já na leitura: o GDAL aplica o WHERE
+    # e o envelope do estado, e os polígonos dos outros estados nunca viram objetos
+    # Python. Se o shapefile não tiver as colunas esperadas, o filtro é relaxado até
+    # a leitura completa.
+    # Quando o shapefile tem a coluna 'year', aqui são lidos apenas os atributos (com o
+    # FID como índice): as geometrias são lidas depois, um ano por vez, pelos FIDs,
+    # limitando o pico de memória sem varrer o arquivo de novo a cada ano. Essa leitura
+    # não usa Arrow: com bbox e sem geometria, o pyogrio em modo Arrow devolve zero feições.
+    filtros = [
+        {
+            'where': "state = 'PA' AND year >= 2008", 'bbox': BBOX_PARA,
+            'read_geometry': False, 'fid_as_index': True, 'use_arrow': False
+        },
+        {'where': "state = 'PA'", 'bbox': BBOX_PARA},
+        {}
+    ]
+    prodes_gdf = None
+    for filtro in filtros:
+        try:
+            prodes_gdf = ler_shapefile(input_shapefile, **filtro)
+            break
+        except Exception as e:
+            erro = e
+    leitura_por_ano = filtro is filtros[0]
+    
+    if prodes_gdf is None:
+        print(f"Erro ao carregar o shapefile: {str(erro)}")
         return
+    print(f"Shapefile carregado com sucesso. Total de registros: {len(prodes_gdf)}")
     
     # Verificar se o shapefile tem a coluna 'state'
     if 'state' not in prodes_gdf.columns:
@@ -37,16 +171,9 @@ def processar_prodes_para(input_shapefile, output_csv):
         print("Valores únicos na coluna 'state':", prodes_gdf['state'].unique())
         return
     
-    # Carregar shapefile dos municípios do Brasil
-    # Você precisa ter este arquivo. Caso não tenha, pode baixá-lo do IBGE
+    # Aguardar a leitura dos municípios iniciada no começo da função
     try:
-        print("Carregando shapefile dos municípios do Brasil...")
-        # Altere o caminho abaixo para o local onde está o shapefile dos municípios
-        municipios_path = "municipios_ibge/BR_Municipios_2022.shp"  # Substitua pelo caminho correto
-        municipios_gdf = gpd.read_file(municipios_path)
-        
-        # Filtrar apenas municípios do Pará
-        municipios_para = municipios_gdf[municipios_gdf['SIGLA_UF'] == 'PA']
+        municipios_para = futuro_municipios.result()
         print(f"Municípios do Pará carregados: {len(municipios_para)}")
     except Exception as e:
         print(f"Erro ao carregar o shapefile dos municípios: {str(e)}")
@@ -58,8 +185,8 @@ def processar_prodes_para(input_shapefile, output_csv):
         print("Coluna 'year' não encontrada. Tentando extrair do 'class_name'...")
         
         if 'class_name' in para_gdf.columns:
-            # Extrair o ano do campo class_name (formato: "dYYYY")
-            para_gdf['year'] = para_gdf['class_name'].str.extract(r'd(\d{4})').astype(int)
+            # Extrair o ano do campo class_name (formato fixo: "dYYYY"), sem passar por regex
+            para_gdf['year'] = para_gdf['class_name'].str.slice(1, 5).astype('int16')
             print("Anos extraídos do campo 'class_name'.")
         else:
             print("Não foi possível identificar o ano do desmatamento.")
@@ -72,50 +199,51 @@ def processar_prodes_para(input_shapefile, output_csv):
     # Se tiver os dados de municípios, fazer a intersecção espacial
     if municipios_para is not None:
         print("Realizando intersecção espacial com os municípios...")
-        # Garantir que os sistemas de coordenadas sejam iguais
-        if para_gdf.crs != municipios_para.crs:
-            print(f"Reprojetando dados. CRS original: {para_gdf.crs}")
-            para_gdf = para_gdf.to_crs(municipios_para.crs)
         
-        # Realizar a intersecção espacial
+        # Nome da coluna do município pode variar dependendo do shapefile
+        # Comum em shapefiles do IBGE: NM_MUN, NOME, NM_MUNICIP
+        colunas = set(para_gdf.columns) | set(municipios_para.columns)
+        municipio_col = next((col for col in ['NM_MUN', 'NOME', 'NM_MUNICIP', 'NOM_MUN'] if col in colunas), None)
+        
+        if municipio_col is None:
+            print("Coluna do nome do município não encontrada.")
+            print("Colunas disponíveis:", municipios_para.columns.tolist())
+            # Usar código do município como fallback
+            municipio_col = next((col for col in ['CD_MUN', 'COD_MUN', 'GEOCODIGO'] if col in colunas), None)
+        
+        if municipio_col is None:
+            print("Não foi possível encontrar uma coluna de identificação do município.")
+            return
+        
         try:
-            intersec_gdf = gpd.sjoin(para_gdf, municipios_para, how='inner', predicate='intersects')
-            print(f"Intersecção concluída. Registros resultantes: {len(intersec_gdf)}")
-            
-            # Calcular a área de cada polígono em km²
-            if 'area_km' not in intersec_gdf.columns:
-                print("Calculando área em km²...")
-                # Certifique-se de que o CRS esteja em uma projeção que preserva área
-                temp_gdf = intersec_gdf.to_crs(epsg=5880)  # Projeção SIRGAS 2000 / Brazil Polyconic
-                intersec_gdf['area_km'] = temp_gdf.geometry.area / 1_000_000  # Converter de m² para km²
-            
-            # Agrupar por município e ano
-            print("Agrupando dados por município e ano...")
-            
-            # Nome da coluna do município pode variar dependendo do shapefile
-            # Comum em shapefiles do IBGE: NM_MUN, NOME, NM_MUNICIP
-            municipio_col = None
-            for col in ['NM_MUN', 'NOME', 'NM_MUNICIP', 'NOM_MUN']:
-                if col in intersec_gdf.columns:
-                    municipio_col = col
-                    break
-            
-            if municipio_col is None:
-                print("Coluna do nome do município não encontrada.")
-                print("Colunas disponíveis:", intersec_gdf.columns.tolist())
-                # Usar código do município como fallback
-                for col in ['CD_MUN', 'COD_MUN', 'GEOCODIGO']:
-                    if col in intersec_gdf.columns:
-                        municipio_col = col
-                        break
-            
-            if municipio_col is not None:
-                # Agrupar por município e ano, somando as áreas
-                resultado = intersec_gdf.groupby([municipio_col, 'year'])['area_km'].sum().reset_index()
-                print("Agrupamento concluído.")
+            if leitura_por_ano:
+                # Ler, intersectar e agrupar um ano por vez: só as geometrias de um ano
+                # ficam em memória durante a reprojeção e a intersecção
+                parciais = []
+                colunas_lidas = [col for col in ['year', 'area_km', municipio_col] if col in para_gdf.columns]
+                # O índice de para_gdf são os FIDs das feições já filtradas na primeira leitura
+                for ano, fids in sorted(para_gdf.groupby('year').groups.items()):
+                    # Sem Arrow: nesse modo o pyogrio transforma os FIDs em um filtro SQL
+                    # "FID IN (...)", que o GDAL recusa acima de ~5 mil FIDs
+                    try:
+                        bloco_gdf = ler_shapefile(
+                            input_shapefile, fids=fids.to_numpy(), columns=colunas_lidas, use_arrow=False
+                        )
+                    except Exception as e:
+                        print(f"Erro ao carregar as geometrias do ano {ano:.0f}: {str(e)}")
+                        return
+                    print(f"  Ano {ano:.0f}: {len(bloco_gdf)} registros")
+                    parciais.append(agregar_por_municipio(bloco_gdf, municipios_para, municipio_col))
+                
+                # Cada ano gera grupos distintos; basta reordenar como no groupby
+                resultado = pd.concat(parciais, ignore_index=True).sort_values(
+                    [municipio_col, 'year'], kind='stable', ignore_index=True
+                )
             else:
-                print("Não foi possível encontrar uma coluna de identificação do município.")
-                return
+                if para_gdf.crs != municipios_para.crs:
+                    print(f"Reprojetando dados. CRS original: {para_gdf.crs}")
+                resultado = agregar_por_municipio(para_gdf, municipios_para, municipio_col)
+            print("Agrupamento concluído.")
         except Exception as e:
             print(f"Erro durante a intersecção espacial: {str(e)}")
             # Fallback: usar apenas os dados do PRODES sem intersecção